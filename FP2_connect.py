@@ -4,6 +4,7 @@
 # after connection for local commands (e.g. snake.exe, exit, etc.)
 
 import subprocess
+import signal
 import ipaddress
 import socket
 import time
@@ -12,7 +13,17 @@ import pandas as pd
 import os
 import re
 import glob
-from collections import defaultdict
+import hashlib
+import json
+import threading
+import http.client
+import shlex
+import select
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import sys
 
 try:
@@ -23,11 +34,38 @@ except Exception:
 
 PASSWORD = "yourpass"
 SEARCH_PATTERNS = ["*FP2*.csv", "*fp2*.csv", "FP2.csv", "fp2.csv"]
+# Загружать все найденные CSV и объединять их (можно также запустить с --all-csv)
+MERGE_ALL_CSV = False
+# Меньше этого суммарного размера CSV читаются без пула процессов (так быстрее)
+MERGE_POOL_MIN_BYTES = 2 * 1024 * 1024
+# Локальный кэш статики VL/TV (можно также запустить с --cache)
+CACHE_PROXY = False
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "fp2_connect")
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+# При включённом кэше туннель слушает порт + смещение, а кэш — сами 5160/7280
+CACHE_TUNNEL_OFFSET = 10000
+# История замеров команды bench --save
+BENCH_HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".fp2_bench_history.jsonl")
+# Доступ по ssh к самому серверу для команды pull. Изменить!!!
+SERVER_USER = "root"
+SERVER_PASSWORD = PASSWORD
+# Локальный порт, проброшенный через proxyhost на ssh (22) выбранного сервера,
+# 0 — любой свободный
+PULL_SSH_PORT = 0
+PULL_WORKERS = 4
+PULL_CHUNK_SIZE = 8 * 1024 * 1024
+# Кусок без данных дольше этого (сек) перезапускается; лимит на sha256 одного файла
+PULL_STALL_TIMEOUT = 30
+PULL_HASH_TIMEOUT = 600
 
 # ---------------------------------------------------
 # File search
 # ---------------------------------------------------
-def find_csv_in_folder():
+def find_csv_in_folder(all_files=False):
+    """
+    Returns the newest matching CSV path, or the list of all matching
+    paths (newest first) when all_files=True.
+    """
     import sys as _sys
     script_dir = os.path.dirname(os.path.abspath(__file__))
     cwd = os.getcwd()
@@ -47,7 +85,7 @@ def find_csv_in_folder():
         input("\nНажмите Enter для выхода...")
         _sys.exit(1)
 
-    return candidates[0]
+    return candidates if all_files else candidates[0]
 
 # ---------------------------------------------------
 # Load hosts
@@ -68,29 +106,78 @@ def load_hosts(csv_path):
         df["ip сервера"] = df["ip сервера"].astype(str).str.strip()
 
         ip_to_tnums = defaultdict(list)
-        for _, row in df.iterrows():
-            ip = row["ip сервера"]
-            nums = re.findall(r"\d+", str(row["Название камеры турникета"]))
-            ip_to_tnums[ip].extend(map(int, nums))
+        nums = df["Название камеры турникета"].astype(str).str.findall(r"\d+")
+        for ip, found in zip(df["ip сервера"], nums):
+            ip_to_tnums[ip].extend(map(int, found))
 
         df = df.drop_duplicates(subset=["Линия", "Вестибюль", "ip сервера"]).copy()
 
-        def format_display(row):
-            ip = row["ip сервера"]
-            if ip_to_tnums[ip]:
-                numbers = sorted(set(ip_to_tnums[ip]))
-                # show range if multiple
-                if numbers:
-                    return f"{row['Линия']} {row['Вестибюль']} | Турникеты: {numbers[0]}–{numbers[-1]} → {ip}"
-            return f"{row['Линия']} {row['Вестибюль']} → {ip}"
+        def format_display(line, hall, ip):
+            numbers = ip_to_tnums[ip]
+            # show range if multiple
+            if numbers:
+                return f"{line} {hall} | Турникеты: {min(numbers)}–{max(numbers)} → {ip}"
+            return f"{line} {hall} → {ip}"
 
-        df["display_name"] = df.apply(format_display, axis=1)
+        df["display_name"] = [
+            format_display(line, hall, ip)
+            for line, hall, ip in zip(df["Линия"], df["Вестибюль"], df["ip сервера"])
+        ]
         return df[["display_name", "ip сервера"]].reset_index(drop=True), dict(ip_to_tnums)
 
     except Exception as e:
         print(f"❌ Ошибка загрузки CSV '{csv_path}': {e}")
         return pd.DataFrame(columns=["display_name", "ip сервера"]), {}
 
+def load_hosts_merged(csv_paths):
+    """
+    Loads every CSV in csv_paths (ordered newest first) and merges them into
+    one index. On IP conflicts the newest file wins, both for the display
+    name and for the turnstile numbers.
+    Returns (hosts_df, ip_to_tnums) like load_hosts(), hosts_df gets an extra
+    'источник' column with the source file name.
+
+    Files are parsed in a process pool, so the wall time is roughly that of
+    the largest file. Small exports parse faster than a pool starts, those
+    (and everything on a single CPU) are loaded in-process, see
+    MERGE_POOL_MIN_BYTES.
+    """
+    total_size = sum(os.path.getsize(p) for p in csv_paths)
+    workers = min(len(csv_paths), os.cpu_count() or 1)
+    if workers == 1 or total_size < MERGE_POOL_MIN_BYTES:
+        results = [load_hosts(p) for p in csv_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(load_hosts, csv_paths))
+
+    frames = []
+    ip_to_tnums = {}
+    for rank, (path, (df, tnums)) in enumerate(zip(csv_paths, results)):
+        if df.empty:
+            continue
+        df = df.copy()
+        df["источник"] = os.path.basename(path)
+        df["rank"] = rank
+        frames.append(df)
+        for ip, nums in tnums.items():
+            ip_to_tnums.setdefault(ip, nums)
+
+    if not frames:
+        return pd.DataFrame(columns=["display_name", "ip сервера", "источник"]), {}
+
+    merged = pd.concat(frames, ignore_index=True)
+    # keep only the rows of the newest file that knows each ip
+    newest = merged.groupby("ip сервера")["rank"].transform("min")
+    merged = merged[merged["rank"] == newest]
+    return merged[["display_name", "ip сервера", "источник"]].reset_index(drop=True), ip_to_tnums
+
+def format_host(row):
+    """display_name plus the source file, if the index was merged."""
+    source = row.get("источник")
+    if isinstance(source, str) and source:
+        return f"{row['display_name']} [{source}]"
+    return row["display_name"]
+
 # ---------------------------------------------------
 # Helpers
 # ---------------------------------------------------
@@ -108,6 +195,11 @@ def is_port_open(host, port):
     except (OSError, ConnectionRefusedError):
         return False
 
+def find_free_port(host="127.0.0.1"):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
 def wait_for_ports(ports, host="127.0.0.1", timeout=30):
     print("⏳ Ожидаем подключение...")
     start = time.time()
@@ -119,6 +211,432 @@ def wait_for_ports(ports, host="127.0.0.1", timeout=30):
     print("❌ Не удалось дождаться открытия портов.")
     return False
 
+# ---------------------------------------------------
+# Static asset cache (local proxy in front of the tunnel)
+# ---------------------------------------------------
+STATIC_EXTENSIONS = (
+    ".js", ".mjs", ".css", ".map", ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".svg", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp",
+)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+FINGERPRINT_EXTENSIONS = (".js", ".mjs", ".css", ".woff", ".woff2")
+CACHED_HEADERS = ("content-type", "content-encoding", "etag", "last-modified", "cache-control")
+# How often the index is written while the proxy runs (it is also saved on exit)
+CACHE_SAVE_INTERVAL = 10
+
+def is_static_asset(path):
+    parts = urlsplit(path)
+    if parts.path.startswith("/api/"):
+        return False
+    return parts.path.lower().endswith(STATIC_EXTENSIONS)
+
+def is_fingerprinted(path):
+    """
+    Bundles like main.3f9a1c2b.js never change under the same name.
+    Only scripts, styles and fonts count, and the hash needs a hex letter,
+    so dated names like cam_20240101_120000.jpg are not mistaken for one.
+    """
+    name = os.path.basename(urlsplit(path).path)
+    if not name.lower().endswith(FINGERPRINT_EXTENSIONS):
+        return False
+    return any(
+        re.search(r"[a-fA-F]", token)
+        for token in re.findall(r"[.\-_]([0-9a-fA-F]{8,})(?=[.\-_])", name)
+    )
+
+def is_storable(resp):
+    """Responses the server marked as per-request or per-user stay out of the cache."""
+    cache_control = (resp.getheader("Cache-Control") or "").lower()
+    if any(d in cache_control for d in ("no-store", "no-cache", "private")):
+        return False
+    return resp.getheader("Set-Cookie") is None
+
+class AssetCache:
+    """
+    Content-addressed disk cache: blobs are stored by sha256 of the body,
+    index.json maps request keys to blob digests in LRU order. Identical
+    assets of different servers share a single blob.
+    Only the index is touched under the lock, blob I/O happens outside it.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.refs = defaultdict(int)   # digest -> number of keys
+        self.sizes = {}                # digest -> size
+        self.total = 0
+        self.dirty = False
+        self.last_save = time.time()
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                for key, meta in json.load(f).items():
+                    self._add(key, meta)
+        except (OSError, ValueError):
+            pass
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        """
+        Blobs are written before the index is saved, a run that was killed
+        leaves blobs nobody refers to. They would never be evicted.
+        """
+        for directory, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                if name not in self.refs:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _add(self, key, meta):
+        digest = meta["digest"]
+        if self.refs[digest] == 0:
+            self.sizes[digest] = meta["size"]
+            self.total += meta["size"]
+        self.refs[digest] += 1
+        self.entries[key] = meta
+
+    def _drop(self, key):
+        """Removes key, returns the digest if its blob is no longer used."""
+        digest = self.entries.pop(key)["digest"]
+        self.refs[digest] -= 1
+        if self.refs[digest] > 0:
+            return None
+        del self.refs[digest]
+        self.total -= self.sizes.pop(digest)
+        return digest
+
+    def get(self, key):
+        """Returns (meta, body) or (None, None)."""
+        with self.lock:
+            meta = self.entries.get(key)
+            if meta is None:
+                return None, None
+            self.entries.move_to_end(key)
+        try:
+            with open(self._blob_path(meta["digest"]), "rb") as f:
+                return meta, f.read()
+        except OSError:
+            # evicted meanwhile
+            with self.lock:
+                if self.entries.get(key) is meta:
+                    self._drop(key)
+            return None, None
+
+    def put(self, key, body, meta):
+        if len(body) > self.max_bytes:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+
+        evicted = []
+        with self.lock:
+            if key in self.entries:
+                old = self._drop(key)
+                if old and old != digest:
+                    evicted.append(old)
+            self._add(key, dict(meta, digest=digest, size=len(body)))
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                old = self._drop(next(iter(self.entries)))
+                if old:
+                    evicted.append(old)
+            self.dirty = True
+            save_now = time.time() - self.last_save >= CACHE_SAVE_INTERVAL
+
+        for old in evicted:
+            try:
+                os.remove(self._blob_path(old))
+            except OSError:
+                pass
+        if save_now:
+            self.save()
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                snapshot = json.dumps(self.entries)
+                self.dirty = False
+                self.last_save = time.time()
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(snapshot)
+            os.replace(tmp, self.index_path)
+
+class CachingProxyHandler(BaseHTTPRequestHandler):
+    """
+    Serves static assets from AssetCache, everything else (API, video,
+    websockets) is passed straight through to the tunnel port.
+
+    Fingerprinted bundles are keyed by the sha256 of the server's entry page
+    ("/"): servers with the same UI build share them and they are served from
+    disk without asking upstream. Everything else is keyed by the server ip
+    and revalidated with that server on every request.
+    """
+    protocol_version = "HTTP/1.1"
+    upstream_port = None
+    service_port = None
+    server_ip = None
+    cache = None
+    # shared by all connections of one proxy, set by start_cache_proxies()
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if is_static_asset(self.path) and "upgrade" not in self.headers:
+            self._serve_static()
+        else:
+            self._pass_through()
+
+    def do_HEAD(self):
+        self._pass_through()
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD
+
+    def _upstream_headers(self):
+        return {
+            k: v for k, v in self.headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+
+    def _ui_version(self):
+        """sha256 of the entry page, fetched once per proxy (retried every 30 s on failure)."""
+        state = self.state
+        with state["lock"]:
+            if state["version"] or time.time() - state["tried"] < 30:
+                return state["version"]
+            state["tried"] = time.time()
+            conn = http.client.HTTPConnection("127.0.0.1", self.upstream_port, timeout=10)
+            try:
+                conn.request("GET", "/", headers={"Accept-Encoding": "identity"})
+                resp = conn.getresponse()
+                body = resp.read()
+                if resp.status == 200 and body:
+                    state["version"] = hashlib.sha256(body).hexdigest()[:16]
+            except (OSError, http.client.HTTPException):
+                pass
+            finally:
+                conn.close()
+            return state["version"]
+
+    # --- static ---
+    def _serve_static(self):
+        gzip_ok = "gzip" in self.headers.get("Accept-Encoding", "")
+        encoding = "gzip" if gzip_ok else "identity"
+        fingerprinted = is_fingerprinted(self.path)
+        version = self._ui_version() if fingerprinted else None
+        scope = f"v{version}" if version else self.server_ip
+        key = f"{self.service_port}@{scope}{self.path}|{encoding}"
+        meta, body = self.cache.get(key)
+        if meta is not None and version is not None:
+            return self._send_cached(meta, body)
+
+        headers = {
+            k: v for k, v in self._upstream_headers().items()
+            if k.lower() not in ("if-none-match", "if-modified-since", "accept-encoding")
+        }
+        headers["Accept-Encoding"] = encoding
+        if meta is not None:
+            # validators came from this same server, see the key above
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last-modified"):
+                headers["If-Modified-Since"] = meta["last-modified"]
+
+        conn = http.client.HTTPConnection("127.0.0.1", self.upstream_port, timeout=30)
+        try:
+            conn.request("GET", self.path, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            if meta is not None:
+                return self._send_cached(meta, body)
+            self.send_error(502)
+            return
+        finally:
+            conn.close()
+
+        if resp.status == 304 and meta is not None:
+            return self._send_cached(meta, body)
+        if resp.status == 200 and is_storable(resp):
+            new_meta = {h: resp.getheader(h) for h in CACHED_HEADERS if resp.getheader(h)}
+            # without validators a per-server entry could never be reused
+            if version is not None or "etag" in new_meta or "last-modified" in new_meta:
+                self.cache.put(key, data, new_meta)
+                return self._send_cached(new_meta, data)
+
+        self.send_response_only(resp.status, resp.reason)
+        for k, v in resp.getheaders():
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != "content-length":
+                self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_cached(self, meta, body):
+        etag = meta.get("etag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response_only(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response_only(200)
+        for h in CACHED_HEADERS:
+            if meta.get(h):
+                self.send_header(h.title(), meta[h])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # --- pass-through ---
+    def _pass_through(self):
+        if "upgrade" in self.headers or "transfer-encoding" in self.headers:
+            return self._tunnel()
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+
+        conn = http.client.HTTPConnection("127.0.0.1", self.upstream_port, timeout=30)
+        try:
+            conn.request(self.command, self.path, body=body, headers=self._upstream_headers())
+            # keep our own reference: for close-delimited replies
+            # getresponse() detaches the socket from conn
+            sock = conn.sock
+            resp = conn.getresponse()
+            # video streams may stay idle for a while
+            sock.settimeout(None)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.send_error(502)
+            return
+
+        chunked = resp.chunked
+        no_body = self.command == "HEAD" or resp.status in (204, 304) or 100 <= resp.status < 200
+        self.send_response_only(resp.status, resp.reason)
+        for k, v in resp.getheaders():
+            if k.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(k, v)
+        if not no_body:
+            if chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+            elif resp.length is None:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+        self.end_headers()
+
+        try:
+            while not no_body:
+                data = resp.read1(65536)
+                if not data:
+                    break
+                if chunked:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    self.wfile.write(data)
+            if chunked and not no_body:
+                self.wfile.write(b"0\r\n\r\n")
+        except (OSError, http.client.HTTPException):
+            # the reply is already half sent, the only honest signal is closing
+            self.close_connection = True
+        finally:
+            resp.close()
+            conn.close()
+
+    def _tunnel(self):
+        """Raw byte relay for websockets and chunked uploads."""
+        try:
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port), timeout=10)
+        except OSError:
+            self.send_error(502)
+            return
+        upstream.settimeout(None)
+        head = self.requestline + "\r\n" + "".join(
+            f"{k}: {v}\r\n" for k, v in self.headers.items()
+        ) + "\r\n"
+        upstream.sendall(head.encode("latin-1"))
+
+        def client_to_upstream():
+            try:
+                while True:
+                    data = self.rfile.read1(65536)
+                    if not data:
+                        break
+                    upstream.sendall(data)
+                upstream.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        threading.Thread(target=client_to_upstream, daemon=True).start()
+        try:
+            while True:
+                data = upstream.recv(65536)
+                if not data:
+                    break
+                self.wfile.write(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def start_cache_proxies(port_map, cache, ip):
+    """
+    port_map: dict listen_port -> tunnel_port, ip: the server behind the tunnel.
+    Starts one proxy per port in a background thread, returns the servers.
+    """
+    servers = []
+    for listen_port, upstream_port in port_map.items():
+        handler = type("Handler", (CachingProxyHandler,), {
+            "upstream_port": upstream_port,
+            "service_port": listen_port,
+            "server_ip": ip,
+            "cache": cache,
+            "state": {"lock": threading.Lock(), "version": None, "tried": 0},
+        })
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", listen_port), handler)
+        except OSError:
+            for started in servers:
+                started.shutdown()
+                started.server_close()
+            raise
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+def stop_cache_proxies(servers, cache):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    cache.save()
+
 # ---------------------------------------------------
 # Fun stuff
 # ---------------------------------------------------
@@ -274,8 +792,8 @@ def select_ip(hosts_df, ip_to_tnums):
             for ip, nums in ip_to_tnums.items():
                 if num in nums:
                     # find display name for that ip
-                    disp = hosts_df[hosts_df["ip сервера"] == ip]["display_name"].tolist()
-                    display_name = disp[0] if disp else f"→ {ip}"
+                    rows = hosts_df[hosts_df["ip сервера"] == ip]
+                    display_name = format_host(rows.iloc[0]) if len(rows) else f"→ {ip}"
                     matches.append((display_name, ip))
             if len(matches) == 1:
                 print(f"✅ Найден по номеру турникета: {matches[0][0]}")
@@ -307,13 +825,13 @@ def select_ip(hosts_df, ip_to_tnums):
             continue
         elif len(matches) == 1:
             row = matches.iloc[0]
-            print(f"✅ Найдено: {row['display_name']}")
+            print(f"✅ Найдено: {format_host(row)}")
             return row["ip сервера"]
         elif len(matches) <= 9:
             while True:
                 print("🔍 Найдено несколько совпадений:")
                 for i, row in matches.iterrows():
-                    print(f"  {i + 1}: {row['display_name']}")
+                    print(f"  {i + 1}: {format_host(row)}")
                 try:
                     choice = int(input("Введите номер нужного варианта: "))
                     if 1 <= choice <= len(matches):
@@ -325,16 +843,513 @@ def select_ip(hosts_df, ip_to_tnums):
         else:
             print(f"🔎 Найдено {len(matches)} совпадений. Уточните ввод.")
 
+# ---------------------------------------------------
+# Tunnel benchmark
+# ---------------------------------------------------
+def percentile(values, p):
+    """Linear-interpolated percentile, p in 0..100. None for no samples."""
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize(values):
+    return {
+        "n": len(values),
+        "min": min(values) if values else None,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+def print_histogram(values, bins=8, width=30):
+    if not values:
+        return
+    lo, hi = min(values), max(values)
+    step = (hi - lo) / bins or 1
+    counts = [0] * bins
+    for v in values:
+        counts[min(int((v - lo) / step), bins - 1)] += 1
+    top = max(counts)
+    for i, count in enumerate(counts):
+        bar = "█" * round(width * count / top)
+        print(f"    {lo + i * step:8.1f} мс | {bar} {count}")
+
+def measure_connect(port, samples=20, host="127.0.0.1"):
+    """TCP connect time in ms. Local forward: only shows the local ssh listener."""
+    result = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((host, port), timeout=5):
+                result.append((time.perf_counter() - start) * 1000)
+        except OSError:
+            pass
+    return result
+
+def measure_ttfb(port, path="/", samples=10, host="127.0.0.1"):
+    """Time from connect to response headers in ms, goes all the way to the server."""
+    result = []
+    for _ in range(samples):
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            result.append((time.perf_counter() - start) * 1000)
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+    return result
+
+def find_large_asset(port, host="127.0.0.1", limit=20):
+    """
+    Largest static file referenced by the entry page, so the throughput
+    test downloads something bigger than a few-KB index. None if not found.
+    """
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request("GET", "/")
+        resp = conn.getresponse()
+        page = resp.read().decode("utf-8", "replace") if resp.status == 200 else ""
+        refs = []
+        for ref in re.findall(r"""(?:src|href)\s*=\s*["']?([^"'\s>]+)""", page):
+            path = urljoin("/", ref)
+            if not urlsplit(path).netloc and is_static_asset(path) and path not in refs:
+                refs.append(path)
+        best, best_size = None, 0
+        for path in refs[:limit]:
+            conn.request("HEAD", path)
+            resp = conn.getresponse()
+            resp.read()
+            size = int(resp.getheader("Content-Length") or 0)
+            if resp.status == 200 and size > best_size:
+                best, best_size = path, size
+        return best
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
+
+def measure_throughput(port, path, duration=5.0, host="127.0.0.1"):
+    """
+    Downloads path over and over for `duration` seconds.
+    Returns (bytes/s, None) or (None, error) - only 200 replies count.
+    """
+    received = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        while time.perf_counter() < deadline:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            if resp.status != 200:
+                return None, f"HTTP {resp.status} {resp.reason}"
+            while True:
+                data = resp.read1(65536)
+                if not data:
+                    break
+                received += len(data)
+                if time.perf_counter() >= deadline:
+                    break
+            if not resp.isclosed():
+                # stopped mid-body, the connection can't be reused
+                conn.close()
+    except (OSError, http.client.HTTPException) as e:
+        if not received:
+            return None, str(e) or type(e).__name__
+    finally:
+        conn.close()
+    if not received:
+        return None, "нет данных"
+    return received / (time.perf_counter() - start), None
+
+def run_benchmark(ip, port_map, path=None, save=False):
+    """
+    port_map: dict service_port -> tunnel_port, so the cache proxy
+    (if any) doesn't hide the tunnel. path: file for the throughput test,
+    by default the largest static file of the VL page.
+    """
+    print(f"⏱  Замер туннеля до {ip}...")
+    record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "ip": ip}
+
+    for service_port, tunnel_port in port_map.items():
+        for name, values in (
+            ("connect", measure_connect(tunnel_port)),
+            ("ttfb", measure_ttfb(tunnel_port)),
+        ):
+            stats = summarize(values)
+            record[f"{name}_{service_port}"] = stats
+            if not values:
+                print(f"  {service_port} {name}: нет ответа")
+                continue
+            print(
+                f"  {service_port} {name}: p50 {stats['p50']:.1f} мс, p90 {stats['p90']:.1f} мс, "
+                f"p99 {stats['p99']:.1f} мс (мин {stats['min']:.1f}, макс {stats['max']:.1f}, n={stats['n']})"
+            )
+            if name == "ttfb":
+                print_histogram(values)
+
+    service_port, tunnel_port = next(iter(port_map.items()))
+    path = path or find_large_asset(tunnel_port)
+    record["path"] = path
+    if path is None:
+        rate, error = None, "не найден файл для замера, укажите путь: bench /путь"
+    else:
+        rate, error = measure_throughput(tunnel_port, path)
+    record[f"throughput_{service_port}"] = rate
+    if error:
+        record["error"] = error
+        print(f"  {service_port} скорость загрузки: ❌ {error}")
+    else:
+        print(f"  {service_port} скорость загрузки {path}: {rate * 8 / 1e6:.2f} Мбит/с")
+
+    if save:
+        with open(BENCH_HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"💾 Сохранено в {BENCH_HISTORY_FILE}")
+    return record
+
+# ---------------------------------------------------
+# File pull from the server (through the tunnel)
+# ---------------------------------------------------
+def server_ssh_command(ip, port, host="127.0.0.1", user=None, password=None):
+    """
+    ssh command prefix for the server `ip`, reached through the -L `port`
+    forward of the proxyhost tunnel. Connections are multiplexed so chunks
+    don't pay for a new handshake each.
+    Every server answers on the same local address, so host keys and the
+    control socket are kept per ip.
+    """
+    control_path = os.path.join(tempfile.gettempdir(), f"fp2_pull_{ip}_%C")
+    return [
+        "sshpass", "-p", password or SERVER_PASSWORD,
+        "ssh", "-p", str(port),
+        "-o", f"HostKeyAlias={ip}",
+        "-o", "StrictHostKeyChecking=accept-new",
+        "-o", "LogLevel=ERROR",
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPath={control_path}",
+        "-o", "ControlPersist=60",
+        f"{user or SERVER_USER}@{host}",
+    ]
+
+def shell_glob(pattern):
+    """Quotes pattern for the remote shell, leaving only * ? [...] to expand."""
+    parts = re.split(r"([*?]|\[[\w!^-]+\])", pattern)
+    return "".join(
+        part if i % 2 else shlex.quote(part)
+        for i, part in enumerate(parts) if part
+    )
+
+def run_remote(ssh_cmd, command, timeout, cancel=None):
+    """
+    Runs command on the server, returns (returncode, stdout, stderr).
+    ssh runs in its own session so Ctrl+C in the console doesn't reach it;
+    it is killed here on timeout, on `cancel` or when we are interrupted.
+    """
+    proc = subprocess.Popen(
+        ssh_cmd + [command], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, start_new_session=True,
+    )
+    deadline = time.time() + timeout
+    try:
+        while True:
+            try:
+                out, err = proc.communicate(timeout=0.5)
+                return proc.returncode, out, err
+            except subprocess.TimeoutExpired:
+                if time.time() > deadline or (cancel is not None and cancel.is_set()):
+                    raise
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+
+def list_remote_files(ssh_cmd, remote_glob):
+    """Returns [(remote_path, size)] of regular files matching remote_glob."""
+    command = (
+        f'for f in {shell_glob(remote_glob)}; do [ -f "$f" ] && '
+        f'printf "%s\\t%s\\n" "$(wc -c < "$f" | tr -d " ")" "$f"; done; true'
+    )
+    code, stdout, stderr = run_remote(ssh_cmd, command, timeout=60)
+    if code != 0:
+        raise RuntimeError(stderr.strip() or f"ssh вернул код {code}")
+    files = []
+    for line in stdout.splitlines():
+        size, _, path = line.partition("\t")
+        if size.isdigit() and path:
+            files.append((path, int(size)))
+    return files
+
+def remote_sha256(ssh_cmd, path, size, cancel=None):
+    """
+    sha256 of the first `size` bytes, so growing logs still verify.
+    None if it couldn't be computed (that is not a mismatch).
+    """
+    try:
+        code, stdout, _ = run_remote(
+            ssh_cmd, f"head -c {size} {shlex.quote(path)} | sha256sum",
+            timeout=PULL_HASH_TIMEOUT, cancel=cancel,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    digest = stdout.split()[0] if code == 0 and stdout else ""
+    return digest if re.fullmatch(r"[0-9a-f]{64}", digest) else None
+
+def local_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class PullProgress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.transferred = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, n, transferred=True):
+        with self.lock:
+            self.done += n
+            if transferred:
+                self.transferred += n
+
+    def rate(self):
+        return self.transferred / max(time.time() - self.start, 1e-6)
+
+    def line(self):
+        mb = 1024 * 1024
+        return f"📥 {self.done / mb:.1f}/{self.total / mb:.1f} МБ, {self.rate() / mb:.2f} МБ/с"
+
+def fetch_chunk(ssh_cmd, remote_path, part_path, offset, length, progress,
+                retries=3, cancel=None):
+    """
+    Downloads [offset, offset + length) of remote_path into part_path.
+    Returns False if it failed or was cancelled; a chunk with no data for
+    PULL_STALL_TIMEOUT seconds is killed and retried.
+    """
+    command = f"tail -c +{offset + 1} {shlex.quote(remote_path)} | head -c {length}"
+    for attempt in range(retries):
+        if cancel is not None and cancel.is_set():
+            return False
+        got = 0
+        try:
+            proc = subprocess.Popen(
+                ssh_cmd + [command], stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, bufsize=0, start_new_session=True,
+            )
+        except OSError:
+            return False
+        try:
+            with open(part_path, "r+b") as f:
+                f.seek(offset)
+                last_data = time.time()
+                while True:
+                    # short waits so a cancel is noticed quickly
+                    ready, _, _ = select.select([proc.stdout], [], [], 0.5)
+                    stalled = time.time() - last_data > PULL_STALL_TIMEOUT
+                    if stalled or (cancel is not None and cancel.is_set()):
+                        proc.kill()
+                        break
+                    if not ready:
+                        continue
+                    last_data = time.time()
+                    data = proc.stdout.read(65536)
+                    if not data:
+                        break
+                    f.write(data)
+                    got += len(data)
+                    progress.add(len(data))
+        except OSError:
+            proc.kill()
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode == 0 and got == length:
+            return True
+        progress.add(-got)
+    return False
+
+def _plan_pull(files, base, local_dir, chunk_size, progress):
+    """
+    Prepares .part files and returns (jobs, chunks, conflicts) for pull_files():
+    jobs: (remote, size, local, part, done_path), part is None for files already there
+    chunks: (job index, offset, length) still to download
+    conflicts: job indices of local files that exist with another size,
+    those are never overwritten
+    """
+    jobs = []
+    chunks = []
+    conflicts = set()
+    for remote, size in files:
+        local = os.path.join(local_dir, os.path.relpath(remote, base))
+        part, done_path = local + ".part", local + ".part.done"
+        os.makedirs(os.path.dirname(local) or ".", exist_ok=True)
+        if os.path.exists(local) and not os.path.exists(part):
+            # same size: only verify; otherwise it isn't ours to replace
+            if os.path.getsize(local) == size:
+                progress.add(size, transferred=False)
+            else:
+                conflicts.add(len(jobs))
+                progress.total -= size
+            jobs.append((remote, size, local, None, None))
+            continue
+
+        done = set()
+        if os.path.exists(part) and os.path.exists(done_path):
+            with open(done_path) as f:
+                done = {int(x) for x in f.read().split() if x.isdigit()}
+        else:
+            open(part, "wb").close()
+            open(done_path, "w").close()
+        with open(part, "r+b") as f:
+            f.truncate(size)
+
+        for offset in range(0, size, chunk_size):
+            length = min(chunk_size, size - offset)
+            if offset in done:
+                progress.add(length, transferred=False)
+            else:
+                chunks.append((len(jobs), offset, length))
+        jobs.append((remote, size, local, part, done_path))
+    return jobs, chunks, conflicts
+
+def pull_files(ssh_cmd, remote_glob, local_dir, workers=None, chunk_size=None):
+    """
+    Downloads files matching remote_glob into local_dir in parallel chunks.
+    Each file is written to <name>.part, finished chunk offsets are kept in
+    <name>.part.done so an interrupted pull resumes where it stopped.
+    Files are renamed into place only after the sha256 check.
+    Ctrl+C cancels queued chunks, waits for the running ones to stop and
+    re-raises KeyboardInterrupt with the resume state intact.
+    """
+    workers = workers or PULL_WORKERS
+    chunk_size = chunk_size or PULL_CHUNK_SIZE
+
+    try:
+        files = list_remote_files(ssh_cmd, remote_glob)
+    except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+        print(f"❌ Не удалось получить список файлов: {e}")
+        return False
+    if not files:
+        print(f"⛔ По шаблону '{remote_glob}' файлов не найдено.")
+        return False
+
+    # keep the remote directory structure below the common prefix
+    if len(files) == 1:
+        base = os.path.dirname(files[0][0])
+    else:
+        base = os.path.commonpath([p for p, _ in files])
+
+    progress = PullProgress(sum(size for _, size in files))
+    try:
+        jobs, chunks, conflicts = _plan_pull(files, base, local_dir, chunk_size, progress)
+    except OSError as e:
+        print(f"❌ Не удалось подготовить папку {local_dir}: {e}")
+        return False
+
+    print(f"📂 Файлов: {len(files)}, всего {progress.total / 1024 / 1024:.1f} МБ → {local_dir}")
+    done_lock = threading.Lock()
+    failed = set()
+    cancel = threading.Event()
+
+    def run_chunk(chunk):
+        idx, offset, length = chunk
+        remote, _, _, part, done_path = jobs[idx]
+        try:
+            if fetch_chunk(ssh_cmd, remote, part, offset, length, progress, cancel=cancel):
+                with done_lock, open(done_path, "a") as f:
+                    f.write(f"{offset}\n")
+                return
+        except OSError:
+            pass
+        failed.add(idx)
+
+    def verify(idx):
+        """Returns (status, message), status is 'ok', 'failed' or 'unverified'."""
+        remote, size, local, part, done_path = jobs[idx]
+        if idx in failed:
+            return "failed", f"❌ {remote}: не докачан, повторите pull для продолжения"
+        if idx in conflicts:
+            return "failed", (f"❌ {remote}: {local} уже есть и отличается по размеру, "
+                              f"не перезаписываю — удалите его или выберите другую папку")
+        expected = remote_sha256(ssh_cmd, remote, size, cancel=cancel)
+        if expected is None:
+            return "unverified", f"⚠️ {remote}: не удалось проверить контрольную сумму, повторите pull"
+        try:
+            if expected != local_sha256(part or local):
+                if part is None:
+                    # not ours to delete
+                    return "failed", f"❌ {remote}: локальный файл {local} отличается от удалённого"
+                os.remove(part)
+                os.remove(done_path)
+                return "failed", f"❌ {remote}: контрольная сумма не совпала, загрузка сброшена"
+            if part:
+                os.replace(part, local)
+                os.remove(done_path)
+        except OSError as e:
+            return "failed", f"❌ {remote}: {e}"
+        return "ok", None
+
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(1.0):
+            print("\r" + progress.line(), end="", flush=True)
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for future in [pool.submit(run_chunk, c) for c in chunks]:
+            future.result()
+        results = [future.result() for future in [pool.submit(verify, i) for i in range(len(jobs))]]
+    except KeyboardInterrupt:
+        cancel.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+        stop.set()
+        reporter.join()
+        print("\r" + progress.line())
+
+    for _, message in results:
+        if message:
+            print(message)
+    ok = sum(1 for status, _ in results if status == "ok")
+    elapsed = time.time() - progress.start
+    print(
+        f"{'✅' if ok == len(jobs) else '⚠️'} Скачано и проверено {ok}/{len(jobs)} файлов "
+        f"за {elapsed:.1f} с, средняя скорость {progress.rate() / 1024 / 1024:.2f} МБ/с"
+    )
+    return ok == len(jobs)
+
 # ---------------------------------------------------
 # Connection + interactive local commands
 # ---------------------------------------------------
-def interactive_console(proc):
+def interactive_console(proc, ip=None, port_map=None, pull_port=None):
     print("\n🟢 Подключение успешно! Вы можете вводить команды:")
+    print("  - bench [--save] [путь] → замер задержки и скорости туннеля")
+    print("  - pull <удалённый шаблон> [локальная папка] → скачать файлы с сервера")
     print("  - exit / quit / сtrl+C → закрыть соединение и выйти\n")
 
     while True:
         try:
-            cmd = input("🧩 > ").strip().lower()
+            raw = input("🧩 > ").strip()
+            cmd = raw.lower()
+            args = raw.split()[1:]
             if cmd in ("exit", "quit"):
                 print("❌ Отключаюсь...")
                 proc.terminate()
@@ -343,6 +1358,30 @@ def interactive_console(proc):
                 break
             elif cmd in ("snake.exe", "snake"):
                 play_snake()
+            elif cmd.split()[:1] == ["bench"]:
+                save = "--save" in args
+                paths = [a for a in args if a != "--save"]
+                try:
+                    run_benchmark(ip, port_map or {5160: 5160, 7280: 7280},
+                                  paths[0] if paths else None, save)
+                except KeyboardInterrupt:
+                    print("\n⛔ Замер прерван, соединение активно.")
+            elif cmd.split()[:1] == ["pull"]:
+                try:
+                    pull_args = shlex.split(raw)[1:]
+                except ValueError:
+                    pull_args = args
+                if not pull_args:
+                    print("⛔ Использование: pull <удалённый шаблон> [локальная папка]")
+                    continue
+                local_dir = pull_args[1] if len(pull_args) > 1 else os.getcwd()
+                if not pull_port or proc.poll() is not None or not is_port_open("127.0.0.1", pull_port):
+                    print("❌ Проброс ssh до сервера не работает, pull недоступен.")
+                    continue
+                try:
+                    pull_files(server_ssh_command(ip, pull_port), pull_args[0], local_dir)
+                except KeyboardInterrupt:
+                    print("\n⛔ Загрузка прервана, соединение активно. Повторите pull для докачки.")
         except KeyboardInterrupt:
             print("\n⛔ Прервано пользователем.")
             proc.terminate()
@@ -352,33 +1391,66 @@ def interactive_console(proc):
 # Main
 # ---------------------------------------------------
 def main():
-    csv_file = find_csv_in_folder()
-    hosts_df, ip_to_tnums = load_hosts(csv_file)
+    if MERGE_ALL_CSV or "--all-csv" in sys.argv:
+        hosts_df, ip_to_tnums = load_hosts_merged(find_csv_in_folder(all_files=True))
+    else:
+        csv_file = find_csv_in_folder()
+        hosts_df, ip_to_tnums = load_hosts(csv_file)
     if hosts_df.empty:
         print("❌ Таблица хостов пуста или недоступна.")
         return
 
     ip = select_ip(hosts_df, ip_to_tnums)
 
+    use_cache = CACHE_PROXY or "--cache" in sys.argv
+    offset = CACHE_TUNNEL_OFFSET if use_cache else 0
+    port_map = {port: port + offset for port in (5160, 7280)}
+    pull_port = PULL_SSH_PORT or find_free_port()
+
     ssh_command = [
         "sshpass", "-p", PASSWORD,
         "ssh", "proxyhost@10.250.10.15",
         "-N",
-        f"-L5160:{ip}:5160",
-        f"-L7280:{ip}:7280",
+        # a forward that can't bind must not leave another program on that port
+        "-o", "ExitOnForwardFailure=yes",
+    ] + [f"-L{tunnel_port}:{ip}:{port}" for port, tunnel_port in port_map.items()] + [
+        f"-L{pull_port}:{ip}:22",
     ]
 
     print("Подключаюсь...\n")
-    proc = subprocess.Popen(ssh_command)
+    # own session: Ctrl+C in the console must not reach sshpass/ssh
+    proc = subprocess.Popen(ssh_command, start_new_session=True)
+    if hasattr(signal, "SIGHUP"):
+        # ...so closing the terminal has to stop the tunnel explicitly
+        signal.signal(signal.SIGHUP, lambda signum, frame: sys.exit(1))
 
-    if wait_for_ports([5160, 7280]):
+    try:
+        connected = wait_for_ports(list(port_map.values()) + [pull_port])
+    except KeyboardInterrupt:
+        connected = False
+    if connected:
+        if use_cache:
+            cache = AssetCache(CACHE_DIR, CACHE_MAX_BYTES)
+            try:
+                servers = start_cache_proxies(port_map, cache, ip)
+            except OSError as e:
+                print(f"❌ Не удалось запустить кэш на портах {', '.join(map(str, port_map))}: {e}")
+                proc.terminate()
+                return
+            print(f"📦 Кэш статики включён: {CACHE_DIR}")
         print("✅ Подключение успешно!")
         print("VL: http://127.0.0.1:5160")
         print("TV: http://127.0.0.1:7280")
         print("Конфиг TV: http://127.0.0.1:7280/api/camera/nnn\n")
         webbrowser.open("http://127.0.0.1:5160")
         webbrowser.open("http://127.0.0.1:7280")
-        interactive_console(proc)
+        try:
+            interactive_console(proc, ip, port_map, pull_port)
+        finally:
+            if use_cache:
+                stop_cache_proxies(servers, cache)
+            if proc.poll() is None:
+                proc.terminate()
     else:
         print("❌ Подключение неуспешно, завершаю процесс.")
         proc.terminate()
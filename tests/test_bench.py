@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("pandas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import FP2_connect  # noqa: E402
+
+PAGES = {
+    "/": b'<html><link href="/small.css"><script src="static/big.js"></script></html>',
+    "/small.css": b"x" * 100,
+    "/static/big.js": b"y" * 200000,
+}
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, with_body):
+        if self.path == "/truncated":
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            self.wfile.write(b"z" * 10)
+            self.close_connection = True
+            return
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(True)
+
+    def do_HEAD(self):
+        self._reply(False)
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # the throughput test drops connections mid-body on purpose
+        pass
+
+@pytest.fixture
+def port():
+    server = QuietServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+def test_percentile():
+    assert FP2_connect.percentile([1, 2, 3, 4], 50) == 2.5
+    assert FP2_connect.percentile([5], 99) == 5
+
+def test_finds_largest_asset(port):
+    assert FP2_connect.find_large_asset(port) == "/static/big.js"
+
+def test_missing_path_is_an_error_not_a_rate(port):
+    rate, error = FP2_connect.measure_throughput(port, "/missing", duration=0.2)
+    assert rate is None and "404" in error
+
+def test_truncated_body_does_not_raise(port):
+    assert FP2_connect.measure_ttfb(port, "/truncated", samples=2)
+    FP2_connect.measure_throughput(port, "/truncated", duration=0.2)
+
+def test_run_benchmark_history(port, tmp_path, monkeypatch):
+    history = tmp_path / "history.jsonl"
+    measure = FP2_connect.measure_throughput
+    monkeypatch.setattr(FP2_connect, "BENCH_HISTORY_FILE", str(history))
+    monkeypatch.setattr(FP2_connect, "measure_throughput",
+                        lambda port, path: measure(port, path, duration=0.2))
+    record = FP2_connect.run_benchmark("10.0.0.1", {5160: port}, save=True)
+    assert record["path"] == "/static/big.js"
+    assert record["throughput_5160"] > 0
+    assert history.read_text(encoding="utf-8").count("\n") == 1
+
+def test_no_samples_stay_valid_json(tmp_path, monkeypatch):
+    import json
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed = s.getsockname()[1]
+    history = tmp_path / "history.jsonl"
+    monkeypatch.setattr(FP2_connect, "BENCH_HISTORY_FILE", str(history))
+    monkeypatch.setattr(FP2_connect, "measure_connect", lambda port: [])
+    monkeypatch.setattr(FP2_connect, "measure_ttfb", lambda port: [])
+    FP2_connect.run_benchmark("10.0.0.1", {5160: closed}, save=True)
+    record = json.loads(history.read_text(encoding="utf-8"), parse_constant=pytest.fail)
+    assert record["ttfb_5160"]["p50"] is None
+    assert record["throughput_5160"] is None
@@ -0,0 +1,198 @@
+import os
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("pandas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import FP2_connect  # noqa: E402
+
+ASSET = b"body{color:red}" * 100
+BUNDLE = "/static/main.3f9a1c2b.css"
+
+class StandIn(BaseHTTPRequestHandler):
+    """VL/TV stand-in: same build, per-server ETags like mtime-based ones."""
+    protocol_version = "HTTP/1.1"
+    etag = '"server-1"'
+    hits = None
+    snapshots = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.path == "/api/stream":
+            # HTTP/1.0-style close-delimited body
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(b"frame1frame2")
+            self.close_connection = True
+            return
+        if self.path == "/camera/1/snapshot.jpg":
+            type(self).snapshots += 1
+            body = b"frame %d" % self.snapshots
+            self.send_response(200)
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("ETag", '"frame-%d"' % self.snapshots)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/":
+            body = b"<html><script src=/app.js></script></html>"
+        elif self.path == BUNDLE:
+            body = ASSET
+        elif self.path == "/app.css":
+            if self.headers.get("If-None-Match") == self.etag:
+                self.send_response(304)
+                self.send_header("ETag", self.etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = ASSET
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/css")
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def upstream_factory():
+    servers = []
+
+    def make(etag):
+        hits = []
+        handler = type("H", (StandIn,), {"etag": etag, "hits": hits})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1], hits
+
+    yield make
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def run_proxy(cache, upstream_port, ip, listen=None):
+    # the listen port plays the role of 5160/7280 and is part of the cache key
+    listen = listen or free_port()
+    servers = FP2_connect.start_cache_proxies({listen: upstream_port}, cache, ip)
+    return listen, servers
+
+def fetch(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as resp:
+        return resp.read()
+
+def test_close_delimited_pass_through(tmp_path, upstream_factory):
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    upstream, _ = upstream_factory('"a"')
+    port, servers = run_proxy(cache, upstream, "10.0.0.1")
+    try:
+        assert fetch(port, "/api/stream") == b"frame1frame2"
+    finally:
+        FP2_connect.stop_cache_proxies(servers, cache)
+
+def test_second_server_served_from_cache(tmp_path, upstream_factory):
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+
+    first, first_hits = upstream_factory('"server-1"')
+    port, servers = run_proxy(cache, first, "10.0.0.1")
+    assert fetch(port, BUNDLE) == ASSET
+    assert fetch(port, "/app.css") == ASSET
+    assert fetch(port, "/app.css") == ASSET
+    FP2_connect.stop_cache_proxies(servers, cache)
+    # the plain asset is revalidated with its server every time
+    assert first_hits.count("/app.css") == 2
+
+    # different server, same build, its own ETags
+    second, second_hits = upstream_factory('"server-2"')
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    port, servers = run_proxy(cache, second, "10.0.0.2", listen=port)
+    try:
+        assert fetch(port, BUNDLE) == ASSET
+        assert fetch(port, "/app.css") == ASSET
+    finally:
+        FP2_connect.stop_cache_proxies(servers, cache)
+    assert BUNDLE not in second_hits
+    assert "/app.css" in second_hits
+
+def test_no_store_is_never_cached(tmp_path, upstream_factory):
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    upstream, _ = upstream_factory('"a"')
+    port, servers = run_proxy(cache, upstream, "10.0.0.1")
+    try:
+        frames = [fetch(port, "/camera/1/snapshot.jpg") for _ in range(3)]
+    finally:
+        FP2_connect.stop_cache_proxies(servers, cache)
+    assert len(set(frames)) == 3
+    assert not cache.entries
+
+def test_fingerprint_detection():
+    assert FP2_connect.is_fingerprinted("/static/js/main.3f9a1c2b.js")
+    assert FP2_connect.is_fingerprinted("/assets/index-4f2d9e1a.css?v=1")
+    assert not FP2_connect.is_fingerprinted("/snapshots/cam_20240101_120000.jpg")
+    assert not FP2_connect.is_fingerprinted("/media/face_00000042.png")
+    assert not FP2_connect.is_fingerprinted("/static/js/chunk_20240101_1.js")
+    assert not FP2_connect.is_fingerprinted("/app.css")
+
+def test_orphan_blobs_removed_on_load(tmp_path):
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    cache.put("kept", b"kept", {})
+    cache.save()
+    # a run killed before the index was saved
+    cache.put("lost", b"lost", {})
+    reloaded = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    blobs = [n for _, _, names in os.walk(reloaded.blobs_dir) for n in names]
+    assert blobs == [next(iter(reloaded.entries.values()))["digest"]]
+
+def test_busy_port_releases_started_proxies(tmp_path, upstream_factory):
+    import socket
+    cache = FP2_connect.AssetCache(str(tmp_path), 10 ** 6)
+    upstream, _ = upstream_factory('"a"')
+    free = free_port()
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        with pytest.raises(OSError):
+            FP2_connect.start_cache_proxies(
+                {free: upstream, busy.getsockname()[1]: upstream}, cache, "10.0.0.1")
+    # the first proxy was closed again
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", free))
+
+def test_lru_eviction_shares_blobs(tmp_path):
+    cache = FP2_connect.AssetCache(str(tmp_path), 2500)
+    for i in range(3):
+        cache.put(str(i), bytes([i]) * 1000, {})
+    cache.put("same-as-2", bytes([2]) * 1000, {})
+    assert list(cache.entries) == ["1", "2", "same-as-2"]
+    assert cache.total == 2000
+
+    cache.get("1")
+    cache.put("3", b"z" * 1000, {})
+    # dropping "2" frees nothing while "same-as-2" still uses the blob
+    assert list(cache.entries) == ["1", "3"]
+    assert cache.total == 2000
+    assert cache.get("1")[1] == bytes([1]) * 1000
+    assert cache.get("2") == (None, None)
+
+    cache.save()
+    reloaded = FP2_connect.AssetCache(str(tmp_path), 2500)
+    assert list(reloaded.entries) == list(cache.entries)
+    assert reloaded.total == cache.total
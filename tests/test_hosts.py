@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pandas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import FP2_connect  # noqa: E402
+
+HEADER = "FacePay 2.0,,,\nЛиния,Вестибюль,ip сервера,Название камеры турникета\n"
+
+def write_csv(path, rows, mtime):
+    path.write_text(HEADER + "".join(",".join(r) + "\n" for r in rows), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+@pytest.fixture
+def exports(tmp_path):
+    old = write_csv(tmp_path / "FP2_old.csv", [
+        ("Красная", "Северный", "10.0.0.1", "Т1"),
+        ("Синяя", "Южный", "10.0.0.2", "Т5"),
+    ], 1000)
+    new = write_csv(tmp_path / "FP2_new.csv", [
+        ("Красная", "Новый", "10.0.0.1", "Т2"),
+        ("Красная", "Новый", "10.0.0.1", "Т3"),
+    ], 2000)
+    return [new, old]
+
+def test_merged_newest_wins_per_ip(exports):
+    hosts, tnums = FP2_connect.load_hosts_merged(exports)
+    by_ip = dict(zip(hosts["ip сервера"], hosts["источник"]))
+    assert by_ip == {"10.0.0.1": "FP2_new.csv", "10.0.0.2": "FP2_old.csv"}
+    assert tnums["10.0.0.1"] == [2, 3]
+    assert tnums["10.0.0.2"] == [5]
+
+def test_source_is_not_searchable(exports):
+    hosts, _ = FP2_connect.load_hosts_merged(exports)
+    assert not hosts["display_name"].str.contains("csv", case=False).any()
+    assert FP2_connect.format_host(hosts.iloc[0]).endswith("[FP2_new.csv]")
+
+def test_small_exports_skip_the_process_pool(exports, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool should not start for small exports")
+    monkeypatch.setattr(FP2_connect, "ProcessPoolExecutor", no_pool)
+    hosts, _ = FP2_connect.load_hosts_merged(exports)
+    assert len(hosts) == 2
+
+def test_pool_gives_the_same_index(exports, monkeypatch):
+    monkeypatch.setattr(FP2_connect, "MERGE_POOL_MIN_BYTES", 0)
+    pooled, _ = FP2_connect.load_hosts_merged(exports)
+    monkeypatch.setattr(FP2_connect, "MERGE_POOL_MIN_BYTES", 1 << 40)
+    inline, _ = FP2_connect.load_hosts_merged(exports)
+    assert pooled.equals(inline)
@@ -0,0 +1,131 @@
+import os
+import stat
+import sys
+
+import pytest
+
+pytest.importorskip("pandas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import FP2_connect  # noqa: E402
+
+CHUNK = 100000
+
+STAND_IN = """#!/bin/sh
+# ssh stand-in: runs the remote command locally, failures are switched on by files
+echo "$1" >> {d}/calls
+case "$1" in
+  *"tail -c +{fail_offset} "*) [ -e {d}/fail_chunk ] && exit 255 ;;
+  *"tail -c +"*) [ -e {d}/stall ] && sleep 5 ;;
+  *sha256sum*)
+    [ -e {d}/fail_hash ] && exit 255
+    [ -e {d}/bad_hash ] && echo "0000000000000000000000000000000000000000000000000000000000000000  -" && exit 0 ;;
+esac
+exec sh -c "$1"
+"""
+
+@pytest.fixture
+def remote(tmp_path):
+    d = tmp_path / "ctl"
+    d.mkdir()
+    script = tmp_path / "ssh"
+    script.write_text(STAND_IN.format(d=d, fail_offset=2 * CHUNK + 1))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+    src = tmp_path / "my dir"
+    src.mkdir()
+    data = os.urandom(5 * CHUNK + 123)
+    (src / "a.log").write_bytes(data)
+    (src / "b.log").write_bytes(b"")
+    (src / "skip.txt").write_bytes(b"x")
+    return {"ssh": [str(script)], "ctl": d, "src": src, "data": data,
+            "dst": tmp_path / "dst"}
+
+def pull(r):
+    return FP2_connect.pull_files(r["ssh"], f"{r['src']}/*.log", str(r["dst"]), chunk_size=CHUNK)
+
+def chunk_calls(r):
+    calls = (r["ctl"] / "calls").read_text().splitlines()
+    return [c for c in calls if "tail -c +" in c]
+
+def test_glob_with_spaces(remote):
+    assert pull(remote)
+    assert (remote["dst"] / "a.log").read_bytes() == remote["data"]
+    assert (remote["dst"] / "b.log").read_bytes() == b""
+    assert not (remote["dst"] / "skip.txt").exists()
+    assert not list(remote["dst"].glob("*.part*"))
+
+def test_interrupt_and_resume(remote):
+    (remote["ctl"] / "fail_chunk").touch()
+    assert not pull(remote)
+    assert (remote["dst"] / "a.log.part").exists()
+    assert not (remote["dst"] / "a.log").exists()
+
+    (remote["ctl"] / "fail_chunk").unlink()
+    (remote["ctl"] / "calls").unlink()
+    assert pull(remote)
+    assert (remote["dst"] / "a.log").read_bytes() == remote["data"]
+    # only the failed chunk is fetched again
+    assert len(chunk_calls(remote)) == 1
+
+def test_checksum_mismatch_resets_download(remote):
+    (remote["ctl"] / "bad_hash").touch()
+    assert not pull(remote)
+    assert not (remote["dst"] / "a.log.part").exists()
+    assert not (remote["dst"] / "a.log").exists()
+
+def test_hash_failure_keeps_progress(remote):
+    (remote["ctl"] / "fail_hash").touch()
+    assert not pull(remote)
+    assert (remote["dst"] / "a.log.part").read_bytes() == remote["data"]
+
+    (remote["ctl"] / "fail_hash").unlink()
+    (remote["ctl"] / "calls").unlink()
+    assert pull(remote)
+    assert chunk_calls(remote) == []
+    assert (remote["dst"] / "a.log").read_bytes() == remote["data"]
+
+def test_existing_local_file_is_never_deleted(remote):
+    remote["dst"].mkdir()
+    mine = os.urandom(len(remote["data"]))
+    (remote["dst"] / "a.log").write_bytes(mine)
+    assert not pull(remote)
+    assert (remote["dst"] / "a.log").read_bytes() == mine
+
+def test_local_file_of_other_size_is_not_overwritten(remote):
+    remote["dst"].mkdir()
+    (remote["dst"] / "a.log").write_bytes(b"my own notes")
+    assert not pull(remote)
+    assert (remote["dst"] / "a.log").read_bytes() == b"my own notes"
+    assert not (remote["dst"] / "a.log.part").exists()
+    # the other file is still pulled
+    assert (remote["dst"] / "b.log").exists()
+
+def test_cancel_stops_chunk_quickly(remote):
+    import threading
+    import time
+    (remote["ctl"] / "stall").touch()
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    start = time.time()
+    assert not FP2_connect.fetch_chunk(
+        remote["ssh"], str(remote["src"] / "a.log"), os.devnull, 0, CHUNK,
+        FP2_connect.PullProgress(CHUNK), cancel=cancel,
+    )
+    assert time.time() - start < 2
+
+def test_stalled_chunk_does_not_hang(remote, monkeypatch):
+    monkeypatch.setattr(FP2_connect, "PULL_STALL_TIMEOUT", 0.5)
+    (remote["ctl"] / "stall").touch()
+    assert not FP2_connect.fetch_chunk(
+        remote["ssh"], str(remote["src"] / "a.log"), os.devnull, 0, CHUNK,
+        FP2_connect.PullProgress(CHUNK), retries=1,
+    )
+
+def test_missing_ssh_binary(remote):
+    assert not FP2_connect.fetch_chunk(
+        ["/nonexistent/ssh"], "x", os.devnull, 0, 1, FP2_connect.PullProgress(1),
+    )
+
+def test_shell_glob():
+    assert FP2_connect.shell_glob("/var/log/my dir/*.log") == "'/var/log/my dir/'*.log"
+    assert FP2_connect.shell_glob("/x/[ab]?.log; rm -rf /") == "/x/[ab]?'.log; rm -rf /'"